@@ -4,21 +4,117 @@ License: 3-clause BSD (see https://opensource.org/licenses/BSD-3-Clause)
 Author: Hubert Tournier
 """
 
+import collections
+import concurrent.futures
+import functools
 import json
 import logging
 import os
 import platform
 import pprint
+import queue
 import re
+import sqlite3
 import sys
+import threading
 import time
-import urllib.request
 
-import bs4
-import colorama
-import packaging
-import packaging.utils
-import tqdm
+# orjson parses the Web services responses faster, but is not available everywhere
+try:
+    import orjson
+except ImportError:
+    orjson = json
+
+# colorama, packaging, requests and tqdm are imported when needed,
+# in order to start faster when they are not
+
+# Maximum number of simultaneous requests to the Web services
+MAX_WORKERS = 32
+
+# Maximum number of metadata files read simultaneously
+MAX_READERS = 8
+
+# Number of seconds to wait for a Web service response
+HTTP_TIMEOUT = 10
+
+# Open Source Vulnerabilities database Web service
+OSV_API_URL = 'https://api.osv.dev/v1'
+
+# Maximum number of queries in an OSV.dev batch request
+OSV_BATCH_SIZE = 1000
+
+# Version of the format of the Web services caching database
+CACHE_DATABASE_VERSION = 1
+
+# Number of bytes read at once from the packages metadata files
+METADATA_CHUNK_SIZE = 4096
+
+# Version of the format of the packages metadata caching file
+METADATA_CACHE_VERSION = 2
+
+# Regular expressions used when parsing packages metadata
+_SECTION_RE = re.compile(r"^ *\[|\] *$")
+_REQUIREMENT_END_RE = re.compile(r"[ ;!~<=>]")
+_REQUIREMENT_EXTRAS_RE = re.compile(r"^.*] *;* *")
+_AND_RE = re.compile(r" +and +")
+_COMMA_RE = re.compile(r" *, *")
+_QUOTE_END_RE = re.compile(r"['\"].*")
+_EXTRA_MARKER_RE = re.compile(r" *;* *(or)* *extra == ('[^']*'|\"[^\"]*\") *(or)* *")
+_SPACES_RE = re.compile(r" +")
+_CONDITION_RE = re.compile(r"([A-Za-z_]+) *([<=>]=*) *(.*)")
+_NAME_SEPARATORS_RE = re.compile(r"[-_.]+")
+_HEADERS_END_RE = re.compile(rb"\n\r?\n")
+_METADATA_HEADER_RE = re.compile(
+    rb"(?m)^(Metadata-Version|Name|Version|Summary|Requires-Dist): (.*)$"
+)
+
+# Serializes the updates of the packages metadata caching file
+_metadata_cache_lock = threading.Lock()
+
+# Serializes the uses of the Web services caching database connection
+_cache_database_lock = threading.Lock()
+
+# Serializes the creation of the HTTP session shared by the fetching threads
+_http_session_lock = threading.Lock()
+
+
+####################################################################################################
+#pylint: disable=R0902,R0903,R0913
+class Package:
+    """ Information about an installed package """
+    __slots__ = (
+        "directory",
+        "type",
+        "name",
+        "norm_name",
+        "version",
+        "summary",
+        "requires",
+        "extras",
+        "_version_key",
+    )
+
+    def __init__(self, directory, directory_type, name, version, summary, requires, extras):
+        self.directory = directory
+        self.type = directory_type
+        self.name = name
+        self.norm_name = _normalize_name(name)
+        self.version = version
+        self.summary = summary
+        self.requires = requires
+        self.extras = extras
+        self._version_key = None
+
+    @property
+    def version_key(self):
+        """ Returns the comparison key of the package version, computed on first use """
+        if self._version_key is None:
+            self._version_key = _version_key(self.version)
+        return self._version_key
+
+    def __repr__(self):
+        return f"Package({self.name!r}, {self.version!r}, {self.directory!r})"
+#pylint: enable=R0902,R0903,R0913
 
 
 ####################################################################################################
@@ -33,9 +129,16 @@ def get_site_package_dirs():
         system_prefix = f"{sys.base_prefix}" + os.sep + "lib" \
                         + os.sep + f"python{sys.version_info[0]}.{sys.version_info[1]}"
 
-    # We search for "site-package" directories in the Python PATH
+    # We search for "site-package" directories in the Python PATH,
+    # skipping those already seen under another name so that they are only walked once
+    real_paths = set()
     for directory in sys.path:
         if directory.endswith('site-packages'):
+            real_path = os.path.realpath(directory)
+            if real_path in real_paths or not os.path.isdir(real_path):
+                continue
+            real_paths.add(real_path)
+
             if directory.startswith(system_prefix):
                 site_packages_dirs[directory] = 'system'
             else:
@@ -70,8 +173,7 @@ def process_requires_file(filename, requires, extras):
 
             # Handling extra lines (ie. [extra] or [extra:conditions])
             if line[0] == '[':
-                line = re.sub(r"^ *\[", "", line)
-                line = re.sub(r"\] *$", "", line)
+                line = _SECTION_RE.sub("", line)
                 parts = line.split(":")
                 extra = parts[0]
                 if len(parts) > 1:
@@ -83,13 +185,13 @@ def process_requires_file(filename, requires, extras):
 
             # Handling requirements lines
             else:
-                dependency = re.sub(r"[ ;!~<=>].*$", "", line)
+                dependency = _REQUIREMENT_END_RE.split(line, 1)[0]
                 if '[' in dependency:
-                    conditions = re.sub(r"^.*] *;* *", "", line)
+                    conditions = _REQUIREMENT_EXTRAS_RE.sub("", line)
                 else:
-                    conditions = re.sub(r"^" + dependency + " *;* *", "", line)
-                conditions = re.sub(r" +and +", ";", conditions)
-                conditions = re.sub(r" *, *", ";",conditions)
+                    conditions = line[len(dependency):].lstrip(" ;")
+                conditions = _AND_RE.sub(";", conditions)
+                conditions = _COMMA_RE.sub(";", conditions)
 
                 if extra:
                     if dependency not in extras[extra]:
@@ -116,14 +218,179 @@ def process_requires_file(filename, requires, extras):
     return requires, extras
 
 
+####################################################################################################
+def _read_metadata_headers(filename):
+    """ Returns the headers part of a METADATA or PKG-INFO file """
+    headers = bytearray()
+    with open(filename, "rb") as file:
+        while True:
+            chunk = file.read(METADATA_CHUNK_SIZE)
+            if not chunk:
+                break
+
+            # Only looking for the end of headers in the new data (and what may precede it)
+            start = max(0, len(headers) - 2)
+            headers += chunk
+            end = _HEADERS_END_RE.search(headers, start)
+            if end:
+                # The unstructured description begins. We can stop here
+                del headers[end.start():]
+                break
+
+    return bytes(headers)
+
+
+####################################################################################################
+def _process_metadata_file(metadata_file):
+    """ Returns name, version, summary, requires and extras from a METADATA or PKG-INFO file """
+    headers = _read_metadata_headers(metadata_file)
+
+    logging.debug("Processing file: %s", metadata_file)
+    name = ""
+    version = ""
+    summary = ""
+    requires = {}
+    extras = {}
+    for match in _METADATA_HEADER_RE.finditer(headers):
+        key = match.group(1)
+        value = match.group(2).decode("utf-8", errors="ignore").rstrip()
+        if key == b"Metadata-Version":
+            if value != '2.1':
+                logging.info("'%s' has 'Metadata-Version: %s'", metadata_file, value)
+        elif key == b"Name":
+            name = value
+        elif key == b"Version":
+            version = value
+        elif key == b"Summary":
+            summary = value
+
+        else: # key == b"Requires-Dist":
+            logging.debug("Requires-Dist: %s", value)
+
+            line = value
+            dependency = _REQUIREMENT_END_RE.split(line, 1)[0]
+            if '[' in dependency:
+                conditions = _REQUIREMENT_EXTRAS_RE.sub("", line)
+            else:
+                conditions = line[len(dependency):].lstrip(" ;")
+            conditions = _AND_RE.sub(";", conditions)
+            conditions = _COMMA_RE.sub(";", conditions)
+
+            if "extra == " in line:
+                for part in conditions.split("extra == ")[1:]:
+                    extra = _QUOTE_END_RE.sub("", part[1:])
+
+                    # Remove the extra == "NAME" from the conditions
+                    while "extra == " in conditions:
+                        conditions = _EXTRA_MARKER_RE.sub(";", conditions)
+                        conditions = conditions.rstrip(";")
+
+                    if extra not in extras:
+                        extras[extra] = {}
+                    if dependency in extras[extra]:
+                        for condition in conditions.split(";"):
+                            if condition:
+                                extras[extra][dependency].append(_clean_condition(condition))
+                    else:
+                        extras[extra][dependency] = []
+                        for condition in conditions.split(";"):
+                            if condition:
+                                extras[extra][dependency].append(_clean_condition(condition))
+            else:
+                if dependency in requires:
+                    for condition in conditions.split(";"):
+                        if condition:
+                            requires[dependency].append(_clean_condition(condition))
+                else:
+                    requires[dependency] = []
+                    for condition in conditions.split(";"):
+                        if condition:
+                            requires[dependency].append(_clean_condition(condition))
+
+    logging.debug("requires:\n%s", pprint.pformat(requires))
+    logging.debug("extras:\n%s", pprint.pformat(extras))
+
+    return name, version, summary, requires, extras
+
+
+####################################################################################################
+def _process_package_files(metadata_file, requires_file):
+    """ Returns name, version, summary, requires and extras from a package metadata files """
+    name, version, summary, requires, extras = _process_metadata_file(metadata_file)
+
+    # egg-info entries store requirements in a separate file
+    if requires_file:
+        requires, extras = process_requires_file(requires_file, requires, extras)
+
+    return [name, version, summary, requires, extras]
+
+
+####################################################################################################
+def _load_metadata_cache(directory):
+    """ Returns the cached metadata of the packages of a site-packages directory """
+    caching_dir = get_caching_directory()
+    if caching_dir:
+        try:
+            with open(caching_dir + os.sep + "metadata.json", encoding="utf-8") as file:
+                cache = json.load(file)
+            if cache['version'] == METADATA_CACHE_VERSION:
+                return cache['directories'].get(os.path.abspath(directory), {})
+        except (OSError, ValueError, KeyError):
+            pass
+
+    return {}
+
+
+####################################################################################################
+def _save_metadata_cache(directory, entries):
+    """ Replaces the cached metadata of the packages of a site-packages directory """
+    caching_dir = get_caching_directory()
+    if not caching_dir:
+        return
+
+    caching_file = caching_dir + os.sep + "metadata.json"
+    with _metadata_cache_lock:
+        cache = {}
+        try:
+            with open(caching_file, encoding="utf-8") as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            pass
+        if cache.get('version') != METADATA_CACHE_VERSION:
+            cache = {'version': METADATA_CACHE_VERSION, 'directories': {}}
+        cache['directories'][os.path.abspath(directory)] = entries
+
+        # Writing to a temporary file first to avoid leaving a truncated cache if interrupted
+        try:
+            with open(caching_file + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(cache, file)
+            os.replace(caching_file + ".tmp", caching_file)
+        except OSError as error:
+            logging.warning("Error while saving '%s': %s", caching_file, error)
+
+
+####################################################################################################
+def _normalize_name(name):
+    """ Returns a package name normalized as per PEP 503 """
+    return _NAME_SEPARATORS_RE.sub("-", name).lower()
+
+
 ####################################################################################################
 def get_info_from_site_packages_dir(directory, directory_type):
     """ Returns a list of packages information from {dist, egg}-info sub-directories """
     info = []
 
-    # A dictionary to store package/version that we have already been processed
+    # A set to store package/version that we have already been processed
     # (some packages provide both a .dist-info and .egg-info directory)
-    deja_vu = {}
+    deja_vu = set()
+
+    # Packages metadata are only processed again if their files have changed since the last run
+    cached_entries = _load_metadata_cache(directory)
+    entries = {}
+
+    # The package directories, and the metadata files which remain to be processed
+    package_dirs = {}
+    unprocessed = {}
 
     with os.scandir(directory) as items:
         for item in items:
@@ -131,144 +398,61 @@ def get_info_from_site_packages_dir(directory, directory_type):
             and (item.name.endswith('.dist-info') or item.name.endswith('.egg-info')):
                 package_dir = directory + os.sep + item.name
 
+                # Listing the directory gives us the files stats without extra system calls
+                # on some operating systems
+                with os.scandir(package_dir) as children:
+                    files = {child.name: child for child in children}
+
                 if item.name.endswith('.dist-info'):
-                    metadata_file = package_dir + os.sep + 'METADATA'
-                    requires_file = ""
+                    metadata_name = 'METADATA'
+                    requires_name = ''
                 elif item.name.endswith('.egg-info'):
-                    metadata_file = package_dir + os.sep + 'PKG-INFO'
-                    requires_file = package_dir + os.sep + 'requires.txt'
+                    metadata_name = 'PKG-INFO'
+                    requires_name = 'requires.txt'
+                metadata_file = package_dir + os.sep + metadata_name
 
-                if not os.path.isfile(metadata_file):
+                if metadata_name not in files:
                     logging.info("'%s' does not exist!", metadata_file)
+                    continue
+                metadata_stat = files[metadata_name].stat()
+                files_stat = [metadata_stat.st_mtime_ns, metadata_stat.st_size]
+                requires_file = ""
+                if requires_name in files:
+                    requires_file = package_dir + os.sep + requires_name
+                    requires_stat = files[requires_name].stat()
+                    files_stat += [requires_stat.st_mtime_ns, requires_stat.st_size]
+
+                if item.name in cached_entries and cached_entries[item.name]['stat'] == files_stat:
+                    entries[item.name] = cached_entries[item.name]
                 else:
-                    with open(metadata_file, encoding="utf-8", errors="ignore") as file:
-                        lines = file.readlines()
-
-                    logging.debug("Processing file: %s", metadata_file)
-                    name = ""
-                    version = ""
-                    summary = ""
-                    requires = {}
-                    extras = {}
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith("Metadata-Version: "):
-                            if line != 'Metadata-Version: 2.1':
-                                logging.info("'%s' has '%s'", metadata_file, line)
-                        elif line.startswith("Name: "):
-                            name = re.sub(r"^Name: ", "", line)
-                        elif line.startswith("Version: "):
-                            version = re.sub(r"^Version: ", "", line)
-                        elif line.startswith("Summary: "):
-                            summary = re.sub(r"^Summary: ", "", line)
-
-                        elif line.startswith("Requires-Dist: "):
-                            logging.debug(line)
-
-                            line = re.sub(r"^Requires-Dist: ", "", line)
-                            dependency = re.sub(r"[ ;!~<=>].*", "", line)
-                            if '[' in dependency:
-                                conditions = re.sub(r"^.*] *;* *", "", line)
-                            else:
-                                conditions = re.sub(r"^" + dependency + " *;* *", "", line)
-                            conditions = re.sub(r" +and +", ";", conditions)
-                            conditions = re.sub(r" *, *", ";",conditions)
-
-                            if "extra == " in line:
-                                for part in conditions.split("extra == ")[1:]:
-                                    extra = re.sub(r"['\"].*", "", part[1:])
-
-                                    # Remove the extra == "NAME" from the conditions
-                                    while "extra == " in conditions:
-                                        conditions = re.sub(r" *;* *(or)* *extra == ('[^']*'|\"[^\"]*\") *(or)* *", ";", conditions)
-                                        conditions = re.sub(r";*$", "", conditions)
-
-                                    if extra not in extras:
-                                        extras[extra] = {}
-                                    if dependency in extras[extra]:
-                                        for condition in conditions.split(";"):
-                                            if condition:
-                                                extras[extra][dependency].append(_clean_condition(condition))
-                                    else:
-                                        extras[extra][dependency] = []
-                                        for condition in conditions.split(";"):
-                                            if condition:
-                                                extras[extra][dependency].append(_clean_condition(condition))
-                            else:
-                                if dependency in requires:
-                                    for condition in conditions.split(";"):
-                                        if condition:
-                                            requires[dependency].append(_clean_condition(condition))
-                                else:
-                                    requires[dependency] = []
-                                    for condition in conditions.split(";"):
-                                        if condition:
-                                            requires[dependency].append(_clean_condition(condition))
-                        elif line.startswith("Home-page: "):
-                            pass
-                        elif line.startswith("Project-URL: "):
-                            pass
-                        elif line.startswith("Download-URL: "):
-                            pass
-                        elif line.startswith("Author: "):
-                            pass
-                        elif line.startswith("Author-email: "):
-                            pass
-                        elif line.startswith("Maintainer: "):
-                            pass
-                        elif line.startswith("Maintainer-email: "):
-                            pass
-                        elif line.startswith("License: "):
-                            pass
-                        elif line.startswith("License-Expression: "):
-                            pass
-                        elif line.startswith("License-File: "):
-                            pass
-                        elif line.startswith("Platform: "):
-                            pass
-                        elif line.startswith("Requires-Python: "):
-                            pass
-                        elif line.startswith("Keywords: "):
-                            pass
-                        elif line.startswith("Classifier: "):
-                            pass
-                        elif line.startswith("Description-Content-Type: "):
-                            pass
-                        elif line.startswith("Provides: "):
-                            pass
-                        elif line.startswith("Provides-Extra: "):
-                            pass
-                        elif not line:
-                            # The unstructured description begins. We can stop here
-                            break
-                        else:
-                            logging.info("'%s' has unknown '%s'", metadata_file, line)
-
-                    logging.debug("requires:\n%s", pprint.pformat(requires))
-                    logging.debug("extras:\n%s", pprint.pformat(extras))
-
-                    # egg-info entries store requirements in a separate file
-                    if requires_file and os.path.isfile(requires_file):
-                        requires, extras = process_requires_file(requires_file, requires, extras)
-
-                    # Some packages provide both a .dist-info and .egg-info directory
-                    # so let's avoid duplicates
-                    if not (name in deja_vu and version in deja_vu[name]):
-                        info.append(
-                            {
-                                "directory": package_dir,
-                                "type": directory_type,
-                                "name": name,
-                                "version": version,
-                                "summary": summary,
-                                "requires": requires,
-                                "extras": extras,
-                            }
-                        )
-                        if name not in deja_vu:
-                            deja_vu[name] = {}
-                        if version not in deja_vu[name]:
-                            deja_vu[name][version] = True
+                    entries[item.name] = {'stat': files_stat, 'info': None}
+                    unprocessed[item.name] = (metadata_file, requires_file)
+                package_dirs[item.name] = package_dir
+
+    # Metadata files which were not cached are read in parallel to overlap their disk accesses
+    if unprocessed:
+        workers = min(MAX_READERS, len(unprocessed))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for entry_name, package_info in zip(
+                    unprocessed.keys(),
+                    executor.map(lambda files: _process_package_files(*files), unprocessed.values())
+            ):
+                entries[entry_name]['info'] = package_info
+
+    # The packages are listed in the order of the directory entries
+    for entry_name, package_dir in package_dirs.items():
+        name, version, summary, requires, extras = entries[entry_name]['info']
+
+        # Some packages provide both a .dist-info and .egg-info directory
+        # so let's avoid duplicates
+        if (name, version) not in deja_vu:
+            info.append(
+                Package(package_dir, directory_type, name, version, summary, requires, extras)
+            )
+            deja_vu.add((name, version))
+
+    if entries != cached_entries:
+        _save_metadata_cache(directory, entries)
 
     return info
 
@@ -281,64 +465,50 @@ def get_user_and_system_packages():
 
     site_packages_dirs = get_site_package_dirs()
 
+    # Directories are processed one after the other, as their metadata files are read in parallel
     for directory, value in site_packages_dirs.items():
         packages = get_info_from_site_packages_dir(directory, value)
         if value == 'user':
-            if not user_packages:
-                user_packages = packages
-            else:
-                user_packages += packages
-        else: # if site_packages_dirs[directory] == 'system':
-            if not system_packages:
-                system_packages = packages
-            else:
-                system_packages += packages
+            user_packages += packages
+        else: # if value == 'system':
+            system_packages += packages
 
     return user_packages, system_packages
 
 
 ####################################################################################################
-def get_packages_list_max_sizes(packages):
-    """ Returns the maximum width of name/version/summary columns for a packages list """
+def get_packages_list_stats(packages):
+    """ Returns the name/version/summary columns widths and unique packages appearances count """
     longuest_name = len('Package')
     longuest_version = len('Version')
     longuest_summary = len('Summary')
+    unique_packages = {}
 
     for package in packages:
-        name = package['name']
+        name = package.name
         length = len(name)
         if length > longuest_name:
             longuest_name = length
+        if name in unique_packages:
+            unique_packages[name] += 1
+        else:
+            unique_packages[name] = 1
 
-        version = package['version']
+        version = package.version
         length = len(version)
         if length > longuest_version:
             longuest_version = length
 
-        summary = package['summary']
+        summary = package.summary
         length = len(summary)
         if length > longuest_summary:
             longuest_summary = length
 
-    return longuest_name, longuest_version, longuest_summary
-
-
-####################################################################################################
-def get_unique_packages(packages):
-    """ Returns a dictionary of unique packages with appearances count """
-    unique_packages = {}
-
-    for package in packages:
-        name = package['name']
-        if name in unique_packages:
-            unique_packages[name] += 1
-        else:
-            unique_packages[name] = 1
-
-    return unique_packages
+    return longuest_name, longuest_version, longuest_summary, unique_packages
 
 
 ####################################################################################################
+@functools.lru_cache(maxsize=1)
 def get_caching_directory():
     """ Find and create a directory to save cached files """
     directory = ''
@@ -367,163 +537,438 @@ def get_caching_directory():
 
 
 ####################################################################################################
-def get_package_latest_version(package_name):
-    """ Get the last available version for a package """
+@functools.lru_cache(maxsize=1)
+def _get_http_session():
+    """ Returns a HTTP session keeping its connections to the Web services alive """
+    import requests #pylint: disable=C0415
+    import requests.adapters #pylint: disable=C0415
+
+    session = requests.Session()
+
+    # One connection per thread fetching in parallel
+    adapter = requests.adapters.HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+    session.mount('https://', adapter)
+
+    return session
+
+
+####################################################################################################
+def _remove_old_caching_files(caching_dir):
+    """ Removes the Web services responses files cached by versions without a caching database """
+    try:
+        with os.scandir(caching_dir) as items:
+            for item in items:
+                if item.is_file() \
+                and (item.name.endswith('.html') \
+                     or (item.name.endswith('.json') and item.name != 'metadata.json')):
+                    os.remove(item.path)
+    except OSError as error:
+        logging.warning("Error while removing old caching files: %s", error)
+
+
+####################################################################################################
+@functools.lru_cache(maxsize=1)
+def _get_cache_database():
+    """ Returns a connection to the Web services caching database, or None """
     caching_dir = get_caching_directory()
-    caching_file = ''
-    if caching_dir:
-        caching_file = f"{caching_dir}" + os.sep + f"{package_name}.html"
-
-    # If there's a caching file of less than 1 day, read it instead of using the Web service
-    if caching_file \
-    and os.path.isfile(caching_file) \
-    and (time.time() - os.path.getmtime(caching_file)) < 24 * 60 * 60:
-        with open(caching_file, "rb") as file:
-            html = file.read()
-    else:
-        # Using the Pypi Legacy API / Simple Project API
-        # See https://warehouse.pypa.io/api-reference/legacy.html
-        url = f'https://pypi.org/simple/{package_name}/'
+    if not caching_dir:
+        return None
+
+    try:
+        database = sqlite3.connect(caching_dir + os.sep + "cache.sqlite3", check_same_thread=False)
+        database.execute("PRAGMA journal_mode=WAL")
+        database.execute("PRAGMA synchronous=NORMAL")
+
+        # Previous versions of the database didn't store the HTTP validators
+        if database.execute("PRAGMA user_version").fetchone()[0] < CACHE_DATABASE_VERSION:
+            _remove_old_caching_files(caching_dir)
+            database.execute("DROP TABLE IF EXISTS cache")
+            database.execute(f"PRAGMA user_version={CACHE_DATABASE_VERSION}")
+        database.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, fetched_at INTEGER, body BLOB,"
+            " etag TEXT, last_modified TEXT)"
+        )
+        database.commit()
+    except sqlite3.Error as error:
+        logging.warning("Error while opening the caching database: %s", error)
+        return None
+
+    return database
+
+
+####################################################################################################
+def _cache_get(key, max_age):
+    """ Returns a cached Web service response of less than max_age seconds, or None """
+    with _cache_database_lock:
+        database = _get_cache_database()
+        if database is None:
+            return None
+
+        row = database.execute(
+            "SELECT body FROM cache WHERE key = ? AND fetched_at > ?",
+            (key, int(time.time()) - max_age)
+        ).fetchone()
+
+    if row is None:
+        return None
+    return row[0]
+
+
+####################################################################################################
+def _cache_get_validators(key):
+    """ Returns the body, ETag and Last-Modified of a cached Web service response, or None """
+    with _cache_database_lock:
+        database = _get_cache_database()
+        if database is None:
+            return None
+
+        row = database.execute(
+            "SELECT body, etag, last_modified FROM cache WHERE key = ?"
+            " AND (etag IS NOT NULL OR last_modified IS NOT NULL)",
+            (key,)
+        ).fetchone()
+
+    return row
+
+
+####################################################################################################
+def _cache_put(key, body, etag=None, last_modified=None):
+    """ Saves a Web service response in the caching database """
+    with _cache_database_lock:
+        database = _get_cache_database()
+        if database is None:
+            return
+
         try:
-            with urllib.request.urlopen(url) as http:
-                html = http.read()
-        except urllib.error.HTTPError as error:
+            database.execute(
+                "INSERT OR REPLACE INTO cache (key, fetched_at, body, etag, last_modified)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, int(time.time()), body, etag, last_modified)
+            )
+            database.commit()
+        except sqlite3.Error as error:
+            logging.warning("Error while caching '%s': %s", key, error)
+
+
+####################################################################################################
+def _get_json(url):
+    """ Returns a Web service JSON document, from the Web service or the caching database """
+    # If there's a cached response of less than 1 day, use it instead of the Web service
+    json_data = _cache_get(url, 24 * 60 * 60)
+    if json_data is None:
+        import requests #pylint: disable=C0415
+
+        # If there's an expired cached response, only ask for a new one if it has changed
+        headers = {}
+        validators = _cache_get_validators(url)
+        if validators is not None:
+            if validators[1]:
+                headers['If-None-Match'] = validators[1]
+            if validators[2]:
+                headers['If-Modified-Since'] = validators[2]
+
+        with _http_session_lock:
+            session = _get_http_session()
+        try:
+            response = session.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as error:
             logging.warning("Error while fetching '%s': %s", url, error)
-            if error == 'HTTP Error 404: Not Found':
-                # Let's write an empty file to avoid retrying later...
-                if caching_file:
-                    with open(caching_file, "wb") as file:
-                        pass
-            return ''
-
-        if caching_file:
-            with open(caching_file, "wb") as file:
-                file.write(html)
-
-    # Fetching the last filename of the page
-    soup = bs4.BeautifulSoup(html.decode('utf-8'), features='html5lib')
-    a_href_elements = soup.select('a')
-    last_filename = a_href_elements[-1].getText()
-
-    # Getting the version from the filename
-    if last_filename.endswith(".whl"):
-        _, latest_version, _, _ = packaging.utils.parse_wheel_filename(last_filename)
-    else:
-        _, latest_version = packaging.utils.parse_sdist_filename(last_filename)
+            if error.response is not None and error.response.status_code == 404:
+                # Let's cache an empty response to avoid retrying later...
+                _cache_put(url, b'')
+            return {}
+
+        if response.status_code == 304:
+            json_data = validators[0]
+            _cache_put(url, json_data, validators[1], validators[2])
+        else:
+            json_data = response.content
+            _cache_put(
+                url,
+                json_data,
+                response.headers.get('ETag'),
+                response.headers.get('Last-Modified')
+            )
+
+    # An empty response means that the package (or vulnerability) is unknown
+    if not json_data:
+        return {}
+
+    return orjson.loads(json_data)
+
+
+####################################################################################################
+def get_package_latest_version(package_name):
+    """ Get the last available version for a package """
+    # Using the Pypi JSON API / Project API
+    # See https://warehouse.pypa.io/api-reference/json.html#project
+    data = _get_json(f'https://pypi.org/pypi/{package_name}/json')
+    if not data:
+        return ''
+
+    return data['info']['version']
 
-    return str(latest_version)
+
+####################################################################################################
+def _fetch_concurrently(function, arguments, progress_meter=True):
+    """ Returns a dictionary of function results for each arguments tuple, fetched in parallel """
+    results = {}
+
+    pending = queue.Queue()
+    for argument in arguments:
+        pending.put(argument)
+    count = pending.qsize()
+    completed = queue.Queue()
+
+    def fetch():
+        """ Processes the pending arguments until there are no more """
+        while True:
+            try:
+                argument = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                completed.put((argument, function(*argument), None))
+            except Exception as error: #pylint: disable=W0703
+                completed.put((argument, None, error))
+
+    # Daemon threads are used so that an interrupted program doesn't wait for the requests in flight
+    for _ in range(min(MAX_WORKERS, count)):
+        threading.Thread(target=fetch, daemon=True).start()
+
+    progress = range(count)
+    if progress_meter:
+        import tqdm #pylint: disable=C0415
+
+        # The progress meter is redrawn at most 4 times per second or every 1% of progress,
+        # and not displayed at all when its output is not a terminal
+        progress = tqdm.tqdm(
+            progress,
+            total=count,
+            mininterval=0.25,
+            miniters=max(1, count // 100),
+            disable=None,
+        )
+    try:
+        for _ in progress:
+            argument, result, error = completed.get()
+            if error is not None:
+                raise error
+            results[argument] = result
+    except BaseException:
+        # Don't start the pending requests if we are interrupted
+        while True:
+            try:
+                pending.get_nowait()
+            except queue.Empty:
+                break
+        raise
+
+    return results
 
 
 ####################################################################################################
 def get_packages_latest_version(packages, progress_meter=True):
-    """ Get the last available versions for a packages list """
-    latest_versions = {}
+    """ Get the last available versions for a packages list, by normalized names """
+    names = {(package.norm_name,) for package in packages}
 
     if progress_meter:
         print("Fetching packages latest version numbers from the Python Package Index...")
-        for i in tqdm.tqdm(range(len(packages))):
-            name = packages[i]['name']
-            if name not in latest_versions:
-                last_version = get_package_latest_version(name)
-                latest_versions[name] = last_version
+    results = _fetch_concurrently(get_package_latest_version, names, progress_meter)
+    if progress_meter:
         print()
-    else:
-        for package in packages:
-            name = package['name']
-            if name not in latest_versions:
-                last_version = get_package_latest_version(name)
-                latest_versions[name] = last_version
 
-    return latest_versions
+    return {name: latest_version for (name,), latest_version in results.items()}
+
+
+####################################################################################################
+@functools.lru_cache(maxsize=None)
+def _parse_version(version):
+    """ Returns a comparable version object from a version string, memoized """
+    import packaging.version #pylint: disable=C0415
+
+    return packaging.version.parse(version)
+
+
+####################################################################################################
+@functools.lru_cache(maxsize=None)
+def _version_key(version):
+    """ Returns a tuple comparing like the version object of a version string, memoized """
+    # Version objects compare their _key attribute, but in Python code.
+    # Comparing these tuples directly is faster.
+    # _key is private to packaging, so the getattr() fallback on the version object itself
+    # is intentional: it keeps the same results if a packaging release drops or renames it
+    parsed_version = _parse_version(version)
+    return getattr(parsed_version, '_key', parsed_version)
 
 
 ####################################################################################################
 def is_package_outdated(package, latest_versions):
     """ Returns True if the package is outdated """
-    if not latest_versions[package['name']]:
+    if not latest_versions[package.norm_name]:
         return False
 
-    return packaging.version.parse(package['version']) \
-           < packaging.version.parse(latest_versions[package['name']])
+    return package.version_key < _version_key(latest_versions[package.norm_name])
 
 
 ####################################################################################################
-def get_package_vulnerabilities(package_name, package_version):
-    """ Get the known vulnerabilities for a given package name and version """
-    caching_dir = get_caching_directory()
-    caching_file = ''
-    if caching_dir:
-        caching_file = f"{caching_dir}" + os.sep + f"{package_name}-{package_version}.json"
-
-    # If there's a caching file of less than 1 day, read it instead of using the Web service
-    if caching_file \
-    and os.path.isfile(caching_file) \
-    and (time.time() - os.path.getmtime(caching_file)) < 24 * 60 * 60:
-        with open(caching_file, "rb") as file:
-            json_data = file.read()
-    else:
-        # Using the Pypi JSON API / Release API
-        # See https://warehouse.pypa.io/api-reference/json.html#release
-        url = f'https://pypi.org/pypi/{package_name}/{package_version}/json'
+def _query_osv(names_and_versions):
+    """ Returns the lists of vulnerabilities IDs of (name, version) packages, or None on error """
+    import requests #pylint: disable=C0415
+
+    with _http_session_lock:
+        session = _get_http_session()
+
+    # Using the OSV.dev API / Query batch
+    # See https://google.github.io/osv.dev/post-v1-querybatch/
+    url = OSV_API_URL + '/querybatch'
+    queries = [
+        {'package': {'name': name, 'ecosystem': 'PyPI'}, 'version': version}
+        for name, version in names_and_versions
+    ]
+    vulnerabilities_ids = [[] for _ in queries]
+
+    # Queries with many vulnerabilities return them in several pages
+    pending = list(range(len(queries)))
+    while pending:
         try:
-            with urllib.request.urlopen(url) as http:
-                json_data = http.read()
-        except urllib.error.HTTPError as error:
+            response = session.post(
+                url, json={'queries': [queries[i] for i in pending]}, timeout=HTTP_TIMEOUT
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as error:
             logging.warning("Error while fetching '%s': %s", url, error)
-            if error == 'HTTP Error 404: Not Found':
-                # Let's write an empty file to avoid retrying later...
-                if caching_file:
-                    with open(caching_file, "wb") as file:
-                        pass
-            return {}
+            return None
 
-        if caching_file:
-            with open(caching_file, "wb") as file:
-                file.write(json_data)
+        next_pending = []
+        for i, result in zip(pending, orjson.loads(response.content)['results']):
+            vulnerabilities_ids[i] += [
+                vulnerability['id'] for vulnerability in result.get('vulns', [])
+            ]
+            if result.get('next_page_token'):
+                queries[i]['page_token'] = result['next_page_token']
+                next_pending.append(i)
+        pending = next_pending
 
-    data = json.loads(json_data)
+    return vulnerabilities_ids
 
-    return data['vulnerabilities']
+
+####################################################################################################
+def get_vulnerability_details(vulnerability_id, package_name):
+    """ Get the details of a vulnerability affecting a package, from the OSV.dev API """
+    # Using the OSV.dev API / Get vuln by ID
+    # See https://google.github.io/osv.dev/get-v1-vulns/
+    data = _get_json(f'{OSV_API_URL}/vulns/{vulnerability_id}')
+
+    fixed_in = []
+    for affected in data.get('affected', []):
+        package = affected.get('package', {})
+        if package.get('ecosystem') == 'PyPI' \
+        and _normalize_name(package.get('name', '')) == _normalize_name(package_name):
+            for version_range in affected.get('ranges', []):
+                for event in version_range.get('events', []):
+                    if 'fixed' in event and event['fixed'] not in fixed_in:
+                        fixed_in.append(event['fixed'])
+
+    return {
+        'id': vulnerability_id,
+        'aliases': data.get('aliases', []),
+        'details': data.get('details', ''),
+        'fixed_in': fixed_in,
+        'link': f'https://osv.dev/vulnerability/{vulnerability_id}',
+        'source': 'osv',
+        'summary': data.get('summary'),
+        'withdrawn': data.get('withdrawn'),
+    }
 
 
 ####################################################################################################
-def get_packages_vulnerabilities(packages, progress_meter=True):
-    """ Get the known vulnerabilities for a packages list """
+def get_packages_vulnerabilities(packages, progress_meter=True, details=False):
+    """ Get the known vulnerabilities for a packages list, by normalized names and versions """
     vulnerabilities = {}
 
+    names_and_versions = sorted({(package.norm_name, package.version) for package in packages})
+
+    if progress_meter:
+        print("Fetching packages known vulnerabilities"
+              " from the Open Source Vulnerabilities database...")
+
+    # Vulnerabilities IDs are cached for each package version,
+    # and those which are not are queried in batches
+    vulnerabilities_ids = {}
+    queries = []
+    for name, version in names_and_versions:
+        json_data = _cache_get(f'osv:PyPI/{name}@{version}', 24 * 60 * 60)
+        if json_data is None:
+            queries.append((name, version))
+        else:
+            vulnerabilities_ids[(name, version)] = orjson.loads(json_data)
+
+    for i in range(0, len(queries), OSV_BATCH_SIZE):
+        batch = queries[i:i + OSV_BATCH_SIZE]
+        results = _query_osv(batch)
+        if results is None:
+            logging.warning("Vulnerabilities of %d package(s) could not be checked", len(batch))
+        else:
+            for (name, version), ids in zip(batch, results):
+                vulnerabilities_ids[(name, version)] = ids
+                _cache_put(f'osv:PyPI/{name}@{version}', json.dumps(ids).encode('utf-8'))
+
     if progress_meter:
-        print("Fetching packages known vulnerabilities from the Python Package Index...")
-        for i in tqdm.tqdm(range(len(packages))):
-            name = packages[i]['name']
-            version = packages[i]['version']
-            package_vulnerabilities = get_package_vulnerabilities(name, version)
-            if package_vulnerabilities:
-                if name not in vulnerabilities:
-                    vulnerabilities[name] = {}
-                    vulnerabilities[name][version] = package_vulnerabilities
-                elif version not in vulnerabilities[name]:
-                    vulnerabilities[name][version] = package_vulnerabilities
         print()
-    else:
-        for package in packages:
-            name = package['name']
-            version = package['version']
-            package_vulnerabilities = get_package_vulnerabilities(name, version)
-            if package_vulnerabilities:
-                if name not in vulnerabilities:
-                    vulnerabilities[name] = {}
-                    vulnerabilities[name][version] = package_vulnerabilities
-                elif version not in vulnerabilities[name]:
-                    vulnerabilities[name][version] = package_vulnerabilities
+
+    for (name, version), ids in vulnerabilities_ids.items():
+        if ids:
+            if name not in vulnerabilities:
+                vulnerabilities[name] = {}
+            vulnerabilities[name][version] = [
+                {'id': vulnerability_id} for vulnerability_id in ids
+            ]
+
+    # The batch queries only return IDs, so details are fetched separately when we need them
+    if details:
+        vulnerabilities = get_vulnerabilities_details(vulnerabilities, progress_meter)
 
     return vulnerabilities
 
 
+####################################################################################################
+def get_vulnerabilities_details(vulnerabilities, progress_meter=True):
+    """ Returns get_packages_vulnerabilities results detailed as by get_vulnerability_details """
+    arguments = {
+        (vulnerability['id'], name)
+        for name, versions in vulnerabilities.items()
+        for version_vulnerabilities in versions.values()
+        for vulnerability in version_vulnerabilities
+    }
+    if not arguments:
+        return vulnerabilities
+
+    if progress_meter:
+        print("Fetching packages vulnerabilities details"
+              " from the Open Source Vulnerabilities database...")
+    vulnerabilities_details = _fetch_concurrently(
+        get_vulnerability_details, arguments, progress_meter
+    )
+    if progress_meter:
+        print()
+
+    return {
+        name: {
+            version: [vulnerabilities_details[(vulnerability['id'], name)]
+                      for vulnerability in version_vulnerabilities]
+            for version, version_vulnerabilities in versions.items()
+        }
+        for name, versions in vulnerabilities.items()
+    }
+
+
 ####################################################################################################
 def is_package_vulnerable(package, vulnerabilities):
     """ Returns True if the package is vulnerable """
-    return package['name'] in vulnerabilities \
-           and package['version'] in vulnerabilities[package['name']]
+    return package.norm_name in vulnerabilities \
+           and package.version in vulnerabilities[package.norm_name]
 
 
 ####################################################################################################
@@ -537,8 +982,8 @@ def _verify_conditions(name, dependency, conditions):
             # Splitting the condition in a [string, operator, value] triplet
             part = condition.split()
             if len(part) != 3:
-                condition = re.sub(r" +", " ", condition)
-                condition = re.sub(r"([A-Za-z_]+) *([<=>]=*) *(.*)", r"\1 \2 \3", condition)
+                condition = _SPACES_RE.sub(" ", condition)
+                condition = _CONDITION_RE.sub(r"\1 \2 \3", condition)
                 part = condition.split()
                 if len(part) != 3:
                     logging.warning("Condition '%s' for dependency '%s' of package '%s' doesn't have 3 parts. Please report it!", condition, dependency, name)
@@ -570,16 +1015,16 @@ def _verify_conditions(name, dependency, conditions):
                 if value != part[2]:
                     return False
             elif part[1] == '<':
-                if packaging.version.parse(value) >= packaging.version.parse(part[2]):
+                if _parse_version(value) >= _parse_version(part[2]):
                     return False
             elif part[1] == '<=':
-                if packaging.version.parse(value) > packaging.version.parse(part[2]):
+                if _parse_version(value) > _parse_version(part[2]):
                     return False
             elif part[1] == '>':
-                if packaging.version.parse(value) <= packaging.version.parse(part[2]):
+                if _parse_version(value) <= _parse_version(part[2]):
                     return False
             elif part[1] == '>=':
-                if packaging.version.parse(value) < packaging.version.parse(part[2]):
+                if _parse_version(value) < _parse_version(part[2]):
                     return False
             else:
                 logging.warning("Unknown condition operator '%s' for dependency '%s' of package '%s'. Please report it!", condition, dependency, name)
@@ -588,91 +1033,69 @@ def _verify_conditions(name, dependency, conditions):
     return True
 
 
+####################################################################################################
+def _add_requirement(name, dependency, conditions, required_by, extras, extras_seen):
+    """ Records a package dependency, and the dependency extras which remain to be processed """
+    dependency = dependency.lower()
+    # A dependency can reference packages options ("extras") within brackets
+    extra = None
+    if '[' in dependency:
+        extra = dependency.rsplit('[', 1)[1].split(']', 1)[0]
+        dependency = dependency.split('[', 1)[0]
+    dependency = _normalize_name(dependency)
+
+    if extra is not None:
+        # Several comma-separated extras can be specified
+        for part in extra.split(','):
+            if (dependency, part) not in extras_seen:
+                extras_seen.add((dependency, part))
+                extras.append((dependency, part))
+
+    if _verify_conditions(name, dependency, conditions):
+        required_by.setdefault(dependency, set()).add(name)
+
+
 ####################################################################################################
 def get_packages_required_by(packages):
-    """ Returns a dictionary of packages which are required by others """
+    """ Returns a dictionary of packages which are required by others, with sets of the latter """
     required_by = {}
-    extras = {}
 
-    # All comparisons are done case insensitive as packages are usually not precise...
-    for package in packages:
-        name = package['name'].lower()
-        for dependency, conditions in package['requires'].items():
-            dependency = dependency.lower()
-            # A dependency can reference packages options ("extras") within brackets
-            if '[' in dependency:
-                extra = re.sub(r".*\[", "", dependency)
-                extra = re.sub(r"].*", "", extra)
-                dependency = re.sub(r"\[.*", "", dependency)
-                # Several comma-separated extras can be specified
-                for part in extra.split(','):
-                    if dependency in extras:
-                        if part not in extras[dependency]:
-                            extras[dependency].append(part)
-                    else:
-                        extras[dependency] = [part]
+    # The (package, extra) pairs to process, and those already encountered
+    extras = collections.deque()
+    extras_seen = set()
 
-            if _verify_conditions(name, dependency, conditions):
-                if dependency in required_by:
-                    if name not in required_by[dependency]:
-                        required_by[dependency].append(name)
-                else:
-                    required_by[dependency] = [name]
+    # All comparisons are done on PEP 503 normalized names as packages are usually not precise...
+    packages_by_name = {}
+    for package in packages:
+        name = package.norm_name
+        packages_by_name.setdefault(name, []).append(package)
+        for dependency, conditions in package.requires.items():
+            _add_requirement(name, dependency, conditions, required_by, extras, extras_seen)
 
     # If we have encountered extras, let's try to add their new dependencies
     while extras:
-        key = list(extras.keys())[0]
-        value = extras[key]
-
-        for package in packages:
-            name = package['name'].lower()
-            if key == name:
-                for extra in value:
-                    if extra in package['extras']:
-                        for dependency, conditions in package['extras'][extra].items():
-                            dependency = dependency.lower()
-                            # A dependency can reference packages options ("extras") within brackets
-                            if '[' in dependency:
-                                newextra = re.sub(r".*\[", "", dependency)
-                                newextra = re.sub(r"].*", "", newextra)
-                                dependency = re.sub(r"\[.*", "", dependency)
-                                # Several comma-separated extras can be specified
-                                for part in newextra.split(','):
-                                    if dependency in extras:
-                                        if part not in extras[dependency]:
-                                            extras[dependency].append(part)
-                                    else:
-                                        extras[dependency] = [part]
-
-                            if _verify_conditions(name, dependency, conditions):
-                                if dependency in required_by:
-                                    if name not in required_by[dependency]:
-                                        required_by[dependency].append(name)
-                                else:
-                                    required_by[dependency] = [name]
-
-        del extras[key]
-
-    return required_by
+        name, extra = extras.popleft()
+        for package in packages_by_name.get(name, []):
+            if extra in package.extras:
+                for dependency, conditions in package.extras[extra].items():
+                    _add_requirement(name, dependency, conditions, required_by, extras, extras_seen)
 
-
-####################################################################################################
-def is_package_required(package, required_by):
-    """ Returns True if the package is vulnerable """
-    return package['name'].lower() in required_by
+    return {dependency: frozenset(names) for dependency, names in required_by.items()}
 
 
 ####################################################################################################
-def _case_insensitive_sort(element):
-    """ Provides the criteria for case insensitive packages list sorting """
-    return element['name'].lower()
+def is_package_required(package, required_by):
+    """ Returns True if the package is required by another one """
+    return package.norm_name in required_by
 
 
 ####################################################################################################
 def list_packages(packages, latest_versions, vulnerabilities, color=True, details=False):
     """ Prints installed packages list with summaries """
-    longuest_name, longuest_version, longuest_summary = get_packages_list_max_sizes(packages)
-    unique_packages = get_unique_packages(packages)
+    longuest_name, longuest_version, longuest_summary, unique_packages \
+        = get_packages_list_stats(packages)
+
+    import colorama #pylint: disable=C0415
 
     outdated_count = 0
     vulnerable_count = 0
@@ -681,24 +1104,27 @@ def list_packages(packages, latest_versions, vulnerabilities, color=True, detail
     else:
         longuest_name += 2
         longuest_version += 2
-    print(f"{'Package':{longuest_name}}" \
-          + f" {'Version':{longuest_version}} {'Summary':{longuest_summary}}")
-    print(f"{'-' * longuest_name} {'-' * longuest_version} {'-' * longuest_summary}")
-    packages.sort(key=_case_insensitive_sort)
+
+    # The output is gathered and written at once rather than line by line
+    lines = []
+    lines.append(f"{'Package':{longuest_name}}" \
+                 + f" {'Version':{longuest_version}} {'Summary':{longuest_summary}}")
+    lines.append(f"{'-' * longuest_name} {'-' * longuest_version} {'-' * longuest_summary}")
+    packages.sort(key=lambda package: package.name.lower())
     for package in packages:
         outdated = False
         vulnerable = False
 
-        name = f"{package['name']:{longuest_name}}"
-        if unique_packages[package['name']] > 1:
+        name = f"{package.name:{longuest_name}}"
+        if unique_packages[package.name] > 1:
             if color:
                 name = colorama.Fore.YELLOW \
-                       + f"{package['name']:{longuest_name}}" \
+                       + f"{package.name:{longuest_name}}" \
                        + colorama.Fore.WHITE
             else:
-                name = f"{'*' + package['name'] + '*':{longuest_name}}"
+                name = f"{'*' + package.name + '*':{longuest_name}}"
 
-        version = f"{package['version']:{longuest_version}}"
+        version = f"{package.version:{longuest_version}}"
         if latest_versions:
             if is_package_outdated(package, latest_versions):
                 outdated = True
@@ -706,7 +1132,7 @@ def list_packages(packages, latest_versions, vulnerabilities, color=True, detail
                 if color:
                     version = colorama.Fore.YELLOW + version + colorama.Fore.WHITE
                 else:
-                    version = f"{'^' + package['version'] + '^':{longuest_version}}"
+                    version = f"{'^' + package.version + '^':{longuest_version}}"
         if vulnerabilities:
             if is_package_vulnerable(package, vulnerabilities):
                 vulnerable = True
@@ -716,38 +1142,39 @@ def list_packages(packages, latest_versions, vulnerabilities, color=True, detail
                 elif version.startswith('^'):
                     version = version.replace('^', '!')
                 else:
-                    version = f"{'!' + package['version'] + '!':{longuest_version}}"
+                    version = f"{'!' + package.version + '!':{longuest_version}}"
 
-        summary = f"{package['summary']:{longuest_summary}}"
+        summary = f"{package.summary:{longuest_summary}}"
 
         line = f"{name} {version} {summary}"
-        if package['type'] == 'user':
+        if package.type == 'user':
             if color:
                 line = colorama.Style.BRIGHT + line + colorama.Style.RESET_ALL
-        print(line)
+        lines.append(line)
 
         if details:
             if outdated:
-                print(colorama.Fore.GREEN \
-                      + f" => Version {latest_versions[package['name']]} is available" \
-                      + colorama.Fore.WHITE)
+                lines.append(colorama.Fore.GREEN \
+                             + f" => Version {latest_versions[package.norm_name]} is available" \
+                             + colorama.Fore.WHITE)
             if vulnerable:
-                for vulnerability in vulnerabilities[package['name']][package['version']]:
-                    print(colorama.Fore.RED, end='')
-                    print(f" => {vulnerability['id']}:")
-                    print(f"      Aliases: {vulnerability['aliases']}")
-                    print(f"      Details: {vulnerability['details']}")
-                    print(f"      Fixed in: {vulnerability['fixed_in']}")
-                    print(f"      Link: {vulnerability['link']}")
-                    print(f"      Source: {vulnerability['source']}")
-                    print(f"      Summary: {vulnerability['summary']}")
-                    print(f"      Withdrawn: {vulnerability['withdrawn']}", end='')
-                    print(colorama.Fore.WHITE)
-
-    print(f"{'=' * longuest_name}={'=' * longuest_version}={'=' * longuest_summary}")
-    print(f"{len(packages)} package{'s'[:len(packages)^1]}", end='')
+                for vulnerability in vulnerabilities[package.norm_name][package.version]:
+                    lines.append(colorama.Fore.RED + f" => {vulnerability['id']}:")
+                    lines.append(f"      Aliases: {vulnerability['aliases']}")
+                    lines.append(f"      Details: {vulnerability['details']}")
+                    lines.append(f"      Fixed in: {vulnerability['fixed_in']}")
+                    lines.append(f"      Link: {vulnerability['link']}")
+                    lines.append(f"      Source: {vulnerability['source']}")
+                    lines.append(f"      Summary: {vulnerability['summary']}")
+                    lines.append(f"      Withdrawn: {vulnerability['withdrawn']}" \
+                                 + colorama.Fore.WHITE)
+
+    lines.append(f"{'=' * longuest_name}={'=' * longuest_version}={'=' * longuest_summary}")
+    line = f"{len(packages)} package{'' if len(packages) == 1 else 's'}"
     if outdated_count:
-        print(f", {outdated_count} outdated", end='')
+        line += f", {outdated_count} outdated"
     if vulnerable_count:
-        print(f", {vulnerable_count} vulnerable", end='')
-    print()
+        line += f", {vulnerable_count} vulnerable"
+    lines.append(line)
+
+    sys.stdout.write("\n".join(lines) + "\n")
@@ -8,12 +8,14 @@ import getopt
 import logging
 import os
 import sys
+import threading
 
 import libpnu
 
 from .library import get_info_from_site_packages_dir, get_user_and_system_packages, \
                      get_packages_latest_version, is_package_outdated, \
-                     get_packages_vulnerabilities, is_package_vulnerable, \
+                     get_packages_vulnerabilities, get_vulnerabilities_details, \
+                     is_package_vulnerable, \
                      get_packages_required_by, is_package_required, list_packages
 
 # Version string used by the what(1) and ident(1) commands:
@@ -44,42 +46,45 @@ parameters = {
 }
 
 
+# Usage and help message
+_HELP_TEXT = """usage: pipinfo [--debug] [--help|-?] [--version]
+       [-l|--check-latest] [-v|--check-vulns]
+       [-c|--no-color] [-p|--no-progress] [-i|--info]
+       [-S|--system] [-U|--user] [-I|--issues]
+       [-O|--outdated] [-L|--latest|--uptodate]
+       [-V|--vulnerable] [-H|--healthy|--sane]
+       [-N|--not-required] [-R|--required]
+       [--] [directory ...]
+---[ OPTIONS ]-----------------------------------------------------------
+  -l|--check-latest      Check latest versions
+  -v|--check-vulns        Check vulnerabilities
+---[ DISPLAY ]-----------------------------------------------------------
+  -c|--no-color           Toggle off color output
+  -p|--no-progress        Toggle off progress meter
+  -i|--info               Print detailed info on versions & vulnerabilities
+---[ SELECTIONS ]--------------------------------------------------------
+  -H|--healthy|--sane     Select only healthy packages
+  -I|--issues             Select all packages with issues (-O & -V)
+  -L|--latest|--uptodate  Select only latest packages
+  -O|--outdated           Select only outdated packages
+  -S|--system             Select only system packages
+  -U|--user               Select only user packages
+  -N|--not-required       Select only not required packages
+  -R|--required           Select only required packages
+  -V|--vulnerable         Select only vulnerable packages
+---[ MISC ]--------------------------------------------------------------
+  --debug                 Enable debug mode
+  --help|-?               Print usage and this help message and exit
+  --version               Print version and exit
+  --                      Options processing terminator
+
+"""
+
+
 ####################################################################################################
 def _display_help():
     """ Display usage and help """
-    #pylint: disable=C0301
-    print("usage: pipinfo [--debug] [--help|-?] [--version]", file=sys.stderr)
-    print("       [-l|--check-latest] [-v|--check-vulns]", file=sys.stderr)
-    print("       [-c|--no-color] [-p|--no-progress] [-i|--info]", file=sys.stderr)
-    print("       [-S|--system] [-U|--user] [-I|--issues]", file=sys.stderr)
-    print("       [-O|--outdated] [-L|--latest|--uptodate]", file=sys.stderr)
-    print("       [-V|--vulnerable] [-H|--healthy|--sane]", file=sys.stderr)
-    print("       [-N|--not-required] [-R|--required]", file=sys.stderr)
-    print("       [--] [directory ...]", file=sys.stderr)
-    print("---[ OPTIONS ]-----------------------------------------------------------", file=sys.stderr)
-    print("  -l|--check-latest      Check latest versions", file=sys.stderr)
-    print("  -v|--check-vulns        Check vulnerabilities", file=sys.stderr)
-    print("---[ DISPLAY ]-----------------------------------------------------------", file=sys.stderr)
-    print("  -c|--no-color           Toggle off color output", file=sys.stderr)
-    print("  -p|--no-progress        Toggle off progress meter", file=sys.stderr)
-    print("  -i|--info               Print detailed info on versions & vulnerabilities", file=sys.stderr)
-    print("---[ SELECTIONS ]--------------------------------------------------------", file=sys.stderr)
-    print("  -H|--healthy|--sane     Select only healthy packages", file=sys.stderr)
-    print("  -I|--issues             Select all packages with issues (-O & -V)", file=sys.stderr)
-    print("  -L|--latest|--uptodate  Select only latest packages", file=sys.stderr)
-    print("  -O|--outdated           Select only outdated packages", file=sys.stderr)
-    print("  -S|--system             Select only system packages", file=sys.stderr)
-    print("  -U|--user               Select only user packages", file=sys.stderr)
-    print("  -N|--not-required       Select only not required packages", file=sys.stderr)
-    print("  -R|--required           Select only required packages", file=sys.stderr)
-    print("  -V|--vulnerable         Select only vulnerable packages", file=sys.stderr)
-    print("---[ MISC ]--------------------------------------------------------------", file=sys.stderr)
-    print("  --debug                 Enable debug mode", file=sys.stderr)
-    print("  --help|-?               Print usage and this help message and exit", file=sys.stderr)
-    print("  --version               Print version and exit", file=sys.stderr)
-    print("  --                      Options processing terminator", file=sys.stderr)
-    print(file=sys.stderr)
-    #pylint: enable=C0301
+    sys.stderr.write(_HELP_TEXT)
 
 
 ####################################################################################################
@@ -105,6 +110,171 @@ def _process_environment_variables():
     logging.debug(parameters)
 
 
+####################################################################################################
+def _option_debug():
+    """ Enable debug mode """
+    logging.disable(logging.NOTSET)
+
+
+####################################################################################################
+def _option_help():
+    """ Print usage and this help message and exit """
+    _display_help()
+    sys.exit(0)
+
+
+####################################################################################################
+def _option_version():
+    """ Print version and exit """
+    print(ID.replace("@(" + "#)" + " $" + "Id" + ": ", "").replace(" $", ""))
+    sys.exit(0)
+
+
+####################################################################################################
+def _option_no_color():
+    """ Toggle off color output """
+    parameters['Display']['Color'] = False
+
+
+####################################################################################################
+def _option_info():
+    """ Print detailed info on versions & vulnerabilities """
+    parameters['Display']['Detailed info'] = True
+
+
+####################################################################################################
+def _option_check_latest():
+    """ Check latest versions """
+    parameters['Options']['Check latest versions'] = True
+
+
+####################################################################################################
+def _option_no_progress():
+    """ Toggle off progress meter """
+    parameters['Display']['Progress meter'] = False
+
+
+####################################################################################################
+def _option_check_vulns():
+    """ Check vulnerabilities """
+    parameters['Options']['Check vulnerabilities'] = True
+
+
+####################################################################################################
+def _option_healthy():
+    """ Select only healthy packages """
+    parameters['Options']['Check vulnerabilities'] = True
+    parameters['Selections']['Healthy'] = True
+    parameters['Selections']['Vulnerable'] = False
+    parameters['Selections']['Issues'] = False
+
+
+####################################################################################################
+def _option_issues():
+    """ Select all packages with issues """
+    parameters['Options']['Check latest versions'] = True
+    parameters['Options']['Check vulnerabilities'] = True
+    parameters['Selections']['Issues'] = True
+    parameters['Selections']['Outdated'] = False
+    parameters['Selections']['Latest'] = False
+    parameters['Selections']['Vulnerable'] = False
+    parameters['Selections']['Healthy'] = False
+
+
+####################################################################################################
+def _option_latest():
+    """ Select only latest packages """
+    parameters['Options']['Check latest versions'] = True
+    parameters['Selections']['Latest'] = True
+    parameters['Selections']['Outdated'] = False
+    parameters['Selections']['Issues'] = False
+
+
+####################################################################################################
+def _option_not_required():
+    """ Select only not required packages """
+    parameters['Selections']['Not required'] = True
+    parameters['Selections']['Required'] = False
+
+
+####################################################################################################
+def _option_outdated():
+    """ Select only outdated packages """
+    parameters['Options']['Check latest versions'] = True
+    parameters['Selections']['Outdated'] = True
+    parameters['Selections']['Latest'] = False
+    parameters['Selections']['Issues'] = False
+
+
+####################################################################################################
+def _option_required():
+    """ Select only required packages """
+    parameters['Selections']['Required'] = True
+    parameters['Selections']['Not required'] = False
+
+
+####################################################################################################
+def _option_system():
+    """ Select only system packages """
+    parameters['Selections']['System'] = True
+    parameters['Selections']['User'] = False
+
+
+####################################################################################################
+def _option_user():
+    """ Select only user packages """
+    parameters['Selections']['User'] = True
+    parameters['Selections']['System'] = False
+
+
+####################################################################################################
+def _option_vulnerable():
+    """ Select only vulnerable packages """
+    parameters['Options']['Check vulnerabilities'] = True
+    parameters['Selections']['Vulnerable'] = True
+    parameters['Selections']['Healthy'] = False
+    parameters['Selections']['Issues'] = False
+
+
+# Command line options handlers
+_OPTIONS_HANDLERS = {
+    "--debug": _option_debug,
+    "--help": _option_help,
+    "-?": _option_help,
+    "--version": _option_version,
+    "--no-color": _option_no_color,
+    "-c": _option_no_color,
+    "--info": _option_info,
+    "-i": _option_info,
+    "--check-latest": _option_check_latest,
+    "-l": _option_check_latest,
+    "--no-progress": _option_no_progress,
+    "-p": _option_no_progress,
+    "--check-vulns": _option_check_vulns,
+    "-v": _option_check_vulns,
+    "--healthy": _option_healthy,
+    "--sane": _option_healthy,
+    "-H": _option_healthy,
+    "--issues": _option_issues,
+    "-I": _option_issues,
+    "--latest": _option_latest,
+    "--uptodate": _option_latest,
+    "-L": _option_latest,
+    "--not-required": _option_not_required,
+    "-N": _option_not_required,
+    "--outdated": _option_outdated,
+    "-O": _option_outdated,
+    "--required": _option_required,
+    "-R": _option_required,
+    "--system": _option_system,
+    "-S": _option_system,
+    "--user": _option_user,
+    "-U": _option_user,
+    "--vulnerable": _option_vulnerable,
+    "-V": _option_vulnerable,
+}
+
+
 ####################################################################################################
 def _process_command_line():
     """ Process command line options """
@@ -147,81 +317,7 @@ def _process_command_line():
         sys.exit(1)
 
     for option, _ in options:
-
-        if option == "--debug":
-            logging.disable(logging.NOTSET)
-
-        elif option in ("--help", "-?"):
-            _display_help()
-            sys.exit(0)
-
-        elif option == "--version":
-            print(ID.replace("@(" + "#)" + " $" + "Id" + ": ", "").replace(" $", ""))
-            sys.exit(0)
-
-        elif option in ("--no-color", "-c"):
-            parameters['Display']['Color'] = False
-
-        elif option in ("--info", "-i"):
-            parameters['Display']['Detailed info'] = True
-
-        elif option in ("--check-latest", "-l"):
-            parameters['Options']['Check latest versions'] = True
-
-        elif option in ("--no-progress", "-p"):
-            parameters['Display']['Progress meter'] = False
-
-        elif option in ("--check-vulns", "-v"):
-            parameters['Options']['Check vulnerabilities'] = True
-
-        elif option in ("--healthy", "--sane", "-H"):
-            parameters['Options']['Check vulnerabilities'] = True
-            parameters['Selections']['Healthy'] = True
-            parameters['Selections']['Vulnerable'] = False
-            parameters['Selections']['Issues'] = False
-
-        elif option in ("--issues", "-I"):
-            parameters['Options']['Check latest versions'] = True
-            parameters['Options']['Check vulnerabilities'] = True
-            parameters['Selections']['Issues'] = True
-            parameters['Selections']['Outdated'] = False
-            parameters['Selections']['Latest'] = False
-            parameters['Selections']['Vulnerable'] = False
-            parameters['Selections']['Healthy'] = False
-
-        elif option in ("--latest", "--uptodate", "-L"):
-            parameters['Options']['Check latest versions'] = True
-            parameters['Selections']['Latest'] = True
-            parameters['Selections']['Outdated'] = False
-            parameters['Selections']['Issues'] = False
-
-        elif option in ("--not-required", "-N"):
-            parameters['Selections']['Not required'] = True
-            parameters['Selections']['Required'] = False
-
-        elif option in ("--outdated", "-O"):
-            parameters['Options']['Check latest versions'] = True
-            parameters['Selections']['Outdated'] = True
-            parameters['Selections']['Latest'] = False
-            parameters['Selections']['Issues'] = False
-
-        elif option in ("--required", "-R"):
-            parameters['Selections']['Required'] = True
-            parameters['Selections']['Not required'] = False
-
-        elif option in ("--system", "-S"):
-            parameters['Selections']['System'] = True
-            parameters['Selections']['User'] = False
-
-        elif option in ("--user", "-U"):
-            parameters['Selections']['User'] = True
-            parameters['Selections']['System'] = False
-
-        elif option in ("--vulnerable", "-V"):
-            parameters['Options']['Check vulnerabilities'] = True
-            parameters['Selections']['Vulnerable'] = True
-            parameters['Selections']['Healthy'] = False
-            parameters['Selections']['Issues'] = False
+        _OPTIONS_HANDLERS[option]()
 
     logging.debug("_process_command_line(): parameters:")
     logging.debug(parameters)
@@ -231,6 +327,39 @@ def _process_command_line():
     return remaining_arguments
 
 
+####################################################################################################
+def _is_selected(package, latest_versions, vulnerabilities):
+    """ Returns True if the package matches the versions, vulnerabilities and issues selections """
+    outdated = False
+    if parameters['Selections']['Outdated'] \
+    or parameters['Selections']['Latest'] \
+    or parameters['Selections']['Issues']:
+        outdated = is_package_outdated(package, latest_versions)
+        if parameters['Selections']['Outdated']:
+            if not outdated:
+                return False
+        elif parameters['Selections']['Latest']:
+            if outdated:
+                return False
+
+    vulnerable = False
+    if parameters['Selections']['Vulnerable'] \
+    or parameters['Selections']['Healthy'] \
+    or parameters['Selections']['Issues']:
+        vulnerable = is_package_vulnerable(package, vulnerabilities)
+        if parameters['Selections']['Vulnerable']:
+            if not vulnerable:
+                return False
+        elif parameters['Selections']['Healthy']:
+            if vulnerable:
+                return False
+
+    if parameters['Selections']['Issues']:
+        return outdated or vulnerable
+
+    return True
+
+
 ####################################################################################################
 def main():
     """ The program's main entry point """
@@ -255,33 +384,8 @@ def main():
         else:
             packages = user_packages + system_packages
 
-    # Possibly check for and filter latest versions
-    latest_versions = {}
-    if parameters['Options']['Check latest versions']:
-        latest_versions = get_packages_latest_version(packages,
-                                                      parameters['Display']['Progress meter'])
-
-    if parameters['Selections']['Outdated']:
-        packages = [x for x in packages if is_package_outdated(x, latest_versions)]
-    elif parameters['Selections']['Latest']:
-        packages = [x for x in packages if not is_package_outdated(x, latest_versions)]
-
-    # Possibly check for and filter vulnerabilities
-    vulnerabilities = {}
-    if parameters['Options']['Check vulnerabilities']:
-        vulnerabilities = get_packages_vulnerabilities(packages,
-                                                       parameters['Display']['Progress meter'])
-
-    if parameters['Selections']['Vulnerable']:
-        packages = [x for x in packages if is_package_vulnerable(x, vulnerabilities)]
-    elif parameters['Selections']['Healthy']:
-        packages = [x for x in packages if not is_package_vulnerable(x, vulnerabilities)]
-
-    if parameters['Selections']['Issues']:
-        packages = [x for x in packages if is_package_outdated(x, latest_versions)
-                                        or is_package_vulnerable(x, vulnerabilities)]
-
-    # Possibly check for and filter requirements
+    # Possibly check for and filter requirements, before querying Web services
+    # on packages which won't be displayed
     required_by = {}
     if parameters['Selections']['Required'] or parameters['Selections']['Not required']:
         required_by = get_packages_required_by(packages)
@@ -291,6 +395,54 @@ def main():
     elif parameters['Selections']['Not required']:
         packages = [x for x in packages if not is_package_required(x, required_by)]
 
+    # Possibly check for latest versions and vulnerabilities
+    latest_versions = {}
+    vulnerabilities = {}
+    if parameters['Options']['Check latest versions'] \
+    and parameters['Options']['Check vulnerabilities']:
+        # Both checks are done at the same time, with only the first one's progress meter.
+        # The vulnerabilities are queried by a daemon thread, which won't delay exiting
+        # if the program is interrupted
+        results = {}
+
+        def check_vulnerabilities():
+            try:
+                results['Vulnerabilities'] = get_packages_vulnerabilities(packages, False, False)
+            except Exception as error: #pylint: disable=W0703
+                results['Error'] = error
+
+        thread = threading.Thread(target=check_vulnerabilities, daemon=True)
+        thread.start()
+        latest_versions = get_packages_latest_version(packages,
+                                                      parameters['Display']['Progress meter'])
+        thread.join()
+
+        # The background thread errors are reported as if the check had been done here
+        if 'Error' in results:
+            raise results['Error']
+        vulnerabilities = results['Vulnerabilities']
+
+        # The vulnerabilities details are fetched in parallel too, so they are obtained afterwards
+        # from the main thread for the same reason
+        if parameters['Display']['Detailed info']:
+            vulnerabilities = get_vulnerabilities_details(vulnerabilities,
+                                                          parameters['Display']['Progress meter'])
+    elif parameters['Options']['Check latest versions']:
+        latest_versions = get_packages_latest_version(packages,
+                                                      parameters['Display']['Progress meter'])
+    elif parameters['Options']['Check vulnerabilities']:
+        vulnerabilities = get_packages_vulnerabilities(packages,
+                                                       parameters['Display']['Progress meter'],
+                                                       parameters['Display']['Detailed info'])
+
+    # Filter latest versions and vulnerabilities in a single pass
+    if parameters['Selections']['Outdated'] \
+    or parameters['Selections']['Latest'] \
+    or parameters['Selections']['Vulnerable'] \
+    or parameters['Selections']['Healthy'] \
+    or parameters['Selections']['Issues']:
+        packages = [x for x in packages if _is_selected(x, latest_versions, vulnerabilities)]
+
     # Process the remaining packages list
     list_packages(
         packages,